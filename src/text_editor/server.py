@@ -1,24 +1,33 @@
+import asyncio
+import bisect
 import hashlib
 import logging
 import os
 import re
 import subprocess
 import tempfile
+import threading
 import ast
 import tokenize
+import zlib
 import fnmatch
 import io
 import datetime
 import json
 import inspect
 import functools
-from typing import Optional, Dict, Any, Union, Literal
+import itertools
+from typing import Optional, Dict, Any, List, Union, Literal
 import argparse
-import black
-from black.report import NothingChanged
 from fastmcp import FastMCP
 import duckdb
 
+try:
+    import tree_sitter
+    import tree_sitter_javascript
+except ImportError:  # JS/JSX syntax checks fall back to Babel
+    tree_sitter = None
+
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,17 +37,26 @@ logging.basicConfig(
 
 logger = logging.getLogger("text_editor")
 
+# Line boundaries recognised by bytes.splitlines
+LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+TEXT_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+# Stack trace lines from Babel's own modules, dropped from syntax error output
+BABEL_STACK_LINE = re.compile(r"^.*node_modules/@babel.*(?:\n|$)", re.MULTILINE)
 
-def calculate_id(text: str, start: int = None, end: int = None) -> str:
+
+def calculate_id(text: Union[str, bytes], start: int = None, end: int = None) -> str:
     """
     Calculate a unique ID for content verification based on the text content.
 
     The ID is formed by combining a line prefix (if line numbers are provided)
-    with a truncated SHA-256 id of the content. This allows quick verification
-    that content hasn't changed between operations.
+    with the low byte of the content's CRC-32 checksum. This allows quick
+    verification that content hasn't changed between operations. Only 8 bits
+    are kept, so a cryptographic hash would buy nothing over a checksum.
 
     Args:
-        text (str): Content to generate ID for
+        text (Union[str, bytes]): Content to generate ID for; bytes-like objects are
+            hashed as-is, str is UTF-8 encoded first
         start (Optional[int]): Starting line number for the content
         end (Optional[int]): Ending line number for the content
     Returns:
@@ -52,55 +70,267 @@ def calculate_id(text: str, start: int = None, end: int = None) -> str:
         if start == end:
             prefix = f"L{start}-"
 
-    return f"{prefix}{hashlib.sha256(text.encode()).hexdigest()[:2]}"
+    if isinstance(text, str):
+        text = text.encode()
+    return f"{prefix}{zlib.crc32(text) & 0xFF:02x}"
 
 
 def generate_diff_preview(
-    original_lines: list, modified_lines: list, start: int, end: int
+    original_lines: list, new_lines: list, start: int, end: int, first_line: int = 1
 ) -> dict:
     """
     Generate a diff preview comparing original and modified content.
 
     Args:
-        original_lines (list): List of original file lines
-        modified_lines (list): List of modified file lines
+        original_lines (list): List of original file lines, as str or UTF-8 bytes
+        new_lines (list): Lines replacing original lines start to end
         start (int): Start line number of the edit (1-based)
         end (int): End line number of the edit (1-based)
+        first_line (int): Line number of original_lines[0]; lets callers pass only
+            the lines around the edit instead of the whole file
 
     Returns:
         dict: A dictionary with keys prefixed with + or - to indicate additions/deletions
               Format: [("-1", "removed line"), ("+1", "added line")]
     """
+
+    def show(line):
+        if isinstance(line, bytes):
+            # Context lines are only displayed, so invalid UTF-8 must not fail the edit
+            line = line.decode("utf-8", errors="replace")
+        return line.rstrip()
+
+    skip = first_line - 1
     diffs = []
     # Add some context lines before the change
     context_start = max(0, start - 1 - 3)  # 3 lines of context before
     for i in range(context_start, start - 1):
-        diffs.append((i + 1, original_lines[i].rstrip()))
+        diffs.append((i + 1, show(original_lines[i - skip])))
     # Show removed lines
     for i in range(start - 1, end):
-        diffs.append((f"-{i+1}", original_lines[i].rstrip()))
-
-    # Show added lines
-    new_content = "".join(
-        modified_lines[
-            start - 1 : start
-            - 1
-            + len(modified_lines)
-            - len(original_lines)
-            + (end - (start - 1))
-        ]
-    )
-    new_lines = new_content.splitlines()
-    for i, line in enumerate(new_lines):
-        diffs.append((f"+{start+i}", line))
-    context_end = min(len(original_lines), end + 3)  # 3 lines of context after
+        diffs.append((f"-{i+1}", show(original_lines[i - skip])))
+
+    # Show added lines; each one ends with a line break, so they can be split
+    # one at a time instead of joining them into a single string first
+    i = start
+    for new_line in new_lines:
+        for line in new_line.splitlines():
+            diffs.append((f"+{i}", line))
+            i += 1
+    context_end = min(len(original_lines) + skip, end + 3)  # 3 lines of context after
     for i in range(end, context_end):
-        diffs.append((i + 1, original_lines[i].rstrip()))
+        diffs.append((i + 1, show(original_lines[i - skip])))
     return {
         "diff_lines": diffs,
     }
 
 
+def number_lines(lines, start: int = 1) -> list:
+    """
+    Pair lines with their line numbers, the format used by read, skim and find_function.
+
+    Args:
+        lines (Iterable[str]): Lines to number
+        start (int): Line number of the first line (1-based)
+
+    Returns:
+        list: (line_number, line) tuples with trailing whitespace removed
+    """
+    return [(i, line.rstrip()) for i, line in enumerate(lines, start)]
+
+
+def line_offsets(data: bytes) -> list:
+    """
+    Compute the byte offset at which every line of `data` starts.
+
+    Line boundaries follow bytes.splitlines (LF, CRLF and CR), the same rules
+    used when reading a file in text mode. The splitting, length and running-sum
+    steps all run in C, so no per-line Python code is executed.
+
+    Args:
+        data (bytes): Raw file content
+
+    Returns:
+        list: Offsets of length line_count + 1, where line N (1-based) spans
+              data[offsets[N - 1]:offsets[N]] and the last entry is len(data)
+    """
+    return list(itertools.accumulate(map(len, data.splitlines(True)), initial=0))
+
+
+def count_lines(data: bytes) -> int:
+    """
+    Count the lines in `data` without splitting it.
+
+    Uses the same line boundaries as line_offsets, but only runs C-level
+    substring counts, so nothing is allocated per line.
+
+    Args:
+        data (bytes): Raw file content
+
+    Returns:
+        int: Number of lines, including a final line without a line break
+    """
+    count = data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+    if data and not data.endswith((b"\n", b"\r")):
+        count += 1
+    return count
+
+
+def head_lines(data: bytes, n: int) -> list:
+    """
+    Split off the first `n` lines of `data`.
+
+    Only the line breaks up to the n-th line are located, so a large file is
+    not split into a list of all of its lines just to keep a few of them.
+
+    Args:
+        data (bytes): Raw file content
+        n (int): Number of lines to return
+
+    Returns:
+        list: The first `n` lines, without line endings
+    """
+    if n <= 0:
+        return []
+    last_break = next(itertools.islice(LINE_BREAK.finditer(data), n - 1, None), None)
+    if last_break is None:
+        return data.splitlines()
+    return data[: last_break.end()].splitlines()
+
+
+def read_range(data: bytes, offsets: list, start: int, end: int) -> dict:
+    """
+    Read lines start to end of a file's content, as returned by the read tool.
+
+    `end` is clamped to the last line. Only the requested range is split and
+    decoded.
+
+    Args:
+        data (bytes): Raw file content
+        offsets (list): line_offsets of `data`
+        start (int): Start line number (1-based)
+        end (int): End line number (1-based)
+
+    Returns:
+        dict: lines, start_line, end_line, or error for an invalid range
+    """
+    total_lines = len(offsets) - 1
+    if start < 1:
+        return {"error": "start must be at least 1"}
+    if end > total_lines:
+        end = total_lines
+    if start > end:
+        return {"error": f"{start=} cannot be greater than {end=}. {total_lines=}"}
+
+    selected_lines = data[offsets[start - 1] : offsets[end]].splitlines()
+    return {
+        "lines": number_lines(map(bytes.decode, selected_lines), start),
+        "start_line": start,
+        "end_line": end,
+    }
+
+
+def line_ending(data: bytes) -> str:
+    """
+    Detect the line ending used by `data` from its first line break.
+
+    Args:
+        data (bytes): Raw file content
+
+    Returns:
+        str: CRLF, CR or LF; LF when `data` has no line break
+    """
+    match = LINE_BREAK.search(data)
+    return match.group().decode("ascii") if match else "\n"
+
+
+def terminate_line(line: str, newline: str) -> str:
+    """
+    End `line` with `newline`, converting any line breaks inside it as well.
+
+    Args:
+        line (str): Replacement line, with or without a trailing line break
+        newline (str): Line ending to use, as returned by line_ending
+
+    Returns:
+        str: The line with every line break replaced by `newline` and one at the end
+    """
+    parts = TEXT_LINE_BREAK.split(line)
+    if len(parts) > 1 and not parts[-1]:
+        parts.pop()
+    return newline.join(parts) + newline
+
+
+def read_bytes(path: str) -> bytes:
+    """Read the raw content of a file."""
+    # Unbuffered: the whole file is read in one go, so BufferedReader would
+    # only add an extra copy
+    with open(path, "rb", buffering=0) as file:
+        return file.read()
+
+
+def file_digest(path: str, offset: int = 0) -> bytes:
+    """
+    Compute the SHA-256 digest of a file, from `offset` to the end.
+
+    hashlib.file_digest feeds the file straight into the hash object, so the
+    content is never materialized as Python strings or joined into one buffer.
+
+    Args:
+        path (str): Path of the file to hash
+        offset (int, optional): Byte offset to start hashing from
+
+    Returns:
+        bytes: Raw SHA-256 digest of the file content from `offset` onwards
+    """
+    with open(path, "rb", buffering=0) as file:
+        file.seek(offset)
+        return hashlib.file_digest(file, "sha256").digest()
+
+
+def write_tail(path: str, offset: int, data: bytes, truncate: bool = True) -> None:
+    """
+    Replace everything in a file from `offset` onwards with `data`.
+
+    Args:
+        path (str): Path of the file to write
+        offset (int): Byte offset where the new content starts
+        data (bytes): New content for the rest of the file
+        truncate (bool): Cut the file off after `data`; False overwrites just
+            len(data) bytes and leaves the rest of the file in place
+    """
+    with open(path, "r+b") as file:
+        file.seek(offset)
+        file.write(data)
+        if truncate:
+            file.truncate()
+
+
+def find_syntax_error(node) -> Optional[str]:
+    """
+    Describe the first syntax error in a tree-sitter parse tree.
+
+    Only subtrees flagged with has_error are descended into, so a valid tree
+    is rejected by looking at the root node alone.
+
+    Args:
+        node: Root node of a tree-sitter tree
+
+    Returns:
+        Optional[str]: Error description with its 1-based position, or None if the tree is valid
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        row, column = node.start_point
+        if node.is_missing:
+            return f"Missing {node.type!r} at line {row + 1}, column {column + 1}"
+        if node.is_error:
+            return f"Unexpected token at line {row + 1}, column {column + 1}"
+        stack.extend(reversed([child for child in node.children if child.has_error]))
+    return None
+
+
 def create_logging_tool_decorator(original_decorator, log_callback):
     """
     Create a wrapper around the FastMCP tool decorator that logs tool usage.
@@ -184,14 +414,20 @@ class TextEditorServer:
     Attributes:
         mcp (FastMCP): The MCP server instance for handling tool registrations
         max_select_lines (int): Maximum number of lines that can be edited with ID verification
+        skim_max_lines (int): Maximum number of lines returned by skim()
         enable_js_syntax_check (bool): Whether JavaScript syntax checking is enabled
         protected_paths (list): List of file patterns and paths that are restricted from access
         current_file_path (str, optional): Path to the currently active file
         selected_start (int, optional): Start line of the current selection
         selected_end (int, optional): End line of the current selection
         selected_id (str, optional): ID of the current selection for verification
-        pending_modified_lines (list, optional): Pending modified lines for preview before committing
+        pending_content (bytearray, optional): Pending modified file content for preview before committing
         pending_diff (dict, optional): Diff preview of pending changes
+        pending_write_offset (int, optional): Byte offset in the file where the pending changes start
+        pending_write_end (int, optional): Byte offset where the pending changes end, if the rest of the file is unchanged
+        pending_file_stat (list, optional): st_mtime_ns and st_size of the file the pending changes were computed from
+        pending_file_digest (bytes, optional): SHA-256 of that file from pending_write_offset onwards
+        file_cache_size (int): Maximum number of files kept in the read cache
     """
 
     def __init__(self):
@@ -220,6 +456,7 @@ class TextEditorServer:
             )
             logger.debug({"msg": "Logging tool decorator set up complete"})
         self.max_select_lines = int(os.getenv("MAX_SELECT_LINES", "50"))
+        self.skim_max_lines = int(os.getenv("SKIM_MAX_LINES", "500"))
         self.enable_js_syntax_check = os.getenv(
             "ENABLE_JS_SYNTAX_CHECK", "1"
         ).lower() in ["1", "true", "yes"]
@@ -238,12 +475,120 @@ class TextEditorServer:
         self.selected_start = None
         self.selected_end = None
         self.selected_id = None
-        self.pending_modified_lines = None
-        self.pending_diff = None
+        self._clear_pending()
         self.python_venv = os.getenv("PYTHON_VENV")
+        self.file_cache_size = int(os.getenv("FILE_CACHE_SIZE", "16"))
+        self._file_locks = {}
+        self._js_parser = None
+        if tree_sitter is not None and self.enable_js_syntax_check:
+            try:
+                self._js_parser = tree_sitter.Parser(
+                    tree_sitter.Language(tree_sitter_javascript.language())
+                )
+            except Exception as e:
+                # e.g. a grammar built for another tree-sitter ABI version
+                logger.debug(
+                    {"msg": f"tree-sitter unavailable, falling back to Babel: {str(e)}"}
+                )
+        # path -> [st_mtime_ns, st_size, raw bytes, line offsets or None],
+        # least recently used first
+        self._file_cache = {}
+        # Loads run in asyncio.to_thread workers, so the LRU bookkeeping is locked
+        self._file_cache_lock = threading.Lock()
 
         self.register_tools()
 
+    def _clear_pending(self) -> None:
+        """Discard the pending changes and everything recorded to write them."""
+        self.pending_content = None
+        self.pending_diff = None
+        self.pending_write_offset = None
+        self.pending_write_end = None
+        self.pending_file_stat = None
+        self.pending_file_digest = None
+
+    def _file_lock(self, path: str) -> asyncio.Lock:
+        """Return the lock serializing writes to `path`, creating it on first use."""
+        lock = self._file_locks.get(path)
+        if lock is None:
+            lock = self._file_locks[path] = asyncio.Lock()
+        return lock
+
+    def _load(self, path: str) -> bytes:
+        """
+        Return the raw bytes of `path`, served from the read cache when the file
+        has not changed since it was last read.
+
+        A cache entry is valid while the file's st_mtime_ns and st_size match the
+        ones recorded when it was loaded, so a hit costs a single stat call.
+
+        Args:
+            path (str): Path to the file
+
+        Returns:
+            bytes: Contents of the file
+        """
+        return self._entry(path)[2]
+
+    def _load_offsets(self, path: str) -> tuple:
+        """
+        Return the raw bytes of `path` together with its line_offsets.
+
+        The offsets are computed on first use and kept in the cache entry, so
+        repeated reads of an unchanged file slice lines without rescanning it.
+
+        Args:
+            path (str): Path to the file
+
+        Returns:
+            tuple: (bytes, list) contents of the file and its line start offsets
+        """
+        entry = self._entry_offsets(path)
+        return entry[2], entry[3]
+
+    def _entry_offsets(self, path: str) -> list:
+        """Return the cache entry for `path`, with its line offsets filled in."""
+        entry = self._entry(path)
+        if entry[3] is None:
+            entry[3] = line_offsets(entry[2])
+        return entry
+
+    def _entry(self, path: str) -> list:
+        """Return the cache entry for `path`, reloading the file if it has changed."""
+        st = os.stat(path)
+        with self._file_cache_lock:
+            entry = self._file_cache.get(path)
+            if entry is not None and entry[:2] == [st.st_mtime_ns, st.st_size]:
+                # Re-inserting moves the entry to the most recently used end
+                self._file_cache.pop(path, None)
+                self._file_cache[path] = entry
+                return entry
+        return self._store(path, read_bytes(path), st)
+
+    def _store(self, path: str, data: bytes, st: os.stat_result = None) -> list:
+        """
+        Record `data` as the cached contents of `path`, evicting the least
+        recently used entry when the cache is full.
+
+        Args:
+            path (str): Path to the file
+            data (bytes): Contents of the file
+            st (os.stat_result, optional): Stat result matching `data`; taken now if omitted
+
+        Returns:
+            list: The new cache entry
+        """
+        if st is None:
+            st = os.stat(path)
+        entry = [st.st_mtime_ns, st.st_size, data, None]
+        with self._file_cache_lock:
+            # Re-inserting moves the entry to the most recently used end
+            self._file_cache.pop(path, None)
+            self._file_cache[path] = entry
+            while len(self._file_cache) > self.file_cache_size:
+                del self._file_cache[next(iter(self._file_cache))]
+        return entry
+
     def _init_stats_db(self):
         """Initialize the DuckDB database for storing tool usage statistics."""
         logger.debug({"msg": f"Initializing stats database at {self.stats_db_path}"})
@@ -426,27 +771,24 @@ class TextEditorServer:
             """
             if self.current_file_path is None:
                 return {"error": "No file path is set. Use set_file first."}
-            with open(self.current_file_path, "r", encoding="utf-8") as file:
-                lines = file.readlines()
-
-                formatted_lines = []
-                max_lines_to_show = int(os.getenv("SKIM_MAX_LINES", "500"))
-                lines_to_process = lines[:max_lines_to_show]
+            data = await asyncio.to_thread(self._load, self.current_file_path)
+            total_lines = count_lines(data)
 
-                for i, line in enumerate(lines_to_process, 1):
-                    formatted_lines.append((i, line.rstrip()))
+            max_lines_to_show = self.skim_max_lines
+            # Only the shown prefix is split, never the whole file
+            lines_to_process = head_lines(data, max_lines_to_show)
 
             result = {
-                "lines": formatted_lines,
-                "total_lines": len(lines),
+                "lines": number_lines(map(bytes.decode, lines_to_process)),
+                "total_lines": total_lines,
                 "max_select_lines": self.max_select_lines,
             }
 
             # Add hint if file was truncated
-            if len(lines) > max_lines_to_show:
+            if total_lines > max_lines_to_show:
                 result["truncated"] = True
                 result["hint"] = (
-                    f"File has {len(lines)} total lines. Only showing first {max_lines_to_show} lines. Use `read` to view specific line ranges or `find_line` to search for content in the remaining lines."
+                    f"File has {total_lines} total lines. Only showing first {max_lines_to_show} lines. Use `read` to view specific line ranges or `find_line` to search for content in the remaining lines."
                 )
 
             return result
@@ -464,35 +806,50 @@ class TextEditorServer:
             Returns:
                 dict: lines, start_line, end_line
             """
-            result = {}
-
             if self.current_file_path is None:
                 return {"error": "No file path is set. Use set_file first."}
 
             try:
-                with open(self.current_file_path, "r", encoding="utf-8") as file:
-                    lines = file.readlines()
+                data, offsets = await asyncio.to_thread(
+                    self._load_offsets, self.current_file_path
+                )
+                return read_range(data, offsets, start, end)
 
-                if start < 1:
-                    return {"error": "start must be at least 1"}
-                if end > len(lines):
-                    end = len(lines)
-                if start > end:
-                    return {
-                        "error": f"{start=} cannot be greater than {end=}. {len(lines)=}"
-                    }
+            except Exception as e:
+                return {"error": f"Error reading file: {str(e)}"}
 
-                selected_lines = lines[start - 1 : end]
+        @self.mcp.tool()
+        async def read_many(ranges: List[List[int]]) -> Dict[str, Any]:
+            """
+            Read several line ranges from the current file in one call, e.g. the lines around
+            each match returned by find_line. Each range is read like read(start, end).
 
-                formatted_lines = []
-                for i, line in enumerate(selected_lines, start):
-                    formatted_lines.append((i, line.rstrip()))
+            Args:
+                ranges (list): List of [start, end] line number pairs (1-based)
 
-                result["lines"] = formatted_lines
-                result["start_line"] = start
-                result["end_line"] = end
+            Returns:
+                dict: ranges, a list of dicts with lines, start_line, end_line
+            """
+            if self.current_file_path is None:
+                return {"error": "No file path is set. Use set_file first."}
+            if not all(
+                isinstance(pair, (list, tuple)) and len(pair) == 2 for pair in ranges
+            ):
+                return {"error": "ranges must be [start, end] pairs"}
 
-                return result
+            try:
+                data, offsets = await asyncio.to_thread(
+                    self._load_offsets, self.current_file_path
+                )
+
+                result = []
+                for start, end in ranges:
+                    range_result = read_range(data, offsets, start, end)
+                    if "error" in range_result:
+                        return range_result
+                    result.append(range_result)
+
+                return {"ranges": result}
 
             except Exception as e:
                 return {"error": f"Error reading file: {str(e)}"}
@@ -516,14 +873,16 @@ class TextEditorServer:
                 return {"error": "No file path is set. Use set_file first."}
 
             try:
-                with open(self.current_file_path, "r", encoding="utf-8") as file:
-                    lines = file.readlines()
+                data, offsets = await asyncio.to_thread(
+                    self._load_offsets, self.current_file_path
+                )
+                total_lines = len(offsets) - 1
 
                 if start < 1:
                     return {"error": "start must be at least 1."}
 
-                if end > len(lines):
-                    end = len(lines)
+                if end > total_lines:
+                    end = total_lines
 
                 if start > end:
                     return {"error": "start cannot be greater than end."}
@@ -533,17 +892,20 @@ class TextEditorServer:
                         "error": f"Cannot select more than {self.max_select_lines} lines at once (attempted {end - start + 1} lines)."
                     }
 
-                selected_lines = lines[start - 1 : end]
-                text = "".join(selected_lines)
+                selected = data[offsets[start - 1] : offsets[end]]
+                selected_lines = selected.splitlines()
 
-                current_id = calculate_id(text, start, end)
+                # The raw bytes are hashed directly, no decode/encode round trip
+                current_id = calculate_id(selected, start, end)
 
                 self.selected_start = start
                 self.selected_end = end
                 self.selected_id = current_id
 
                 # Convert selected lines to a list without line numbers
-                lines_content = [line.rstrip() for line in selected_lines]
+                lines_content = [
+                    line.decode("utf-8").rstrip() for line in selected_lines
+                ]
 
                 result = {
                     "status": "success",
@@ -551,7 +913,7 @@ class TextEditorServer:
                     "start": start,
                     "end": end,
                     "id": current_id,
-                    "line_count": len(selected_lines),
+                    "line_count": end - start + 1,
                     "message": f"Selected lines {start} to {end} for editing.",
                 }
 
@@ -586,8 +948,10 @@ class TextEditorServer:
                 return {"error": "No selection has been made. Use select tool first."}
 
             try:
-                with open(self.current_file_path, "r", encoding="utf-8") as file:
-                    lines = file.readlines()
+                entry = await asyncio.to_thread(
+                    self._entry_offsets, self.current_file_path
+                )
+                file_stat, data, offsets = entry[:2], entry[2], entry[3]
             except Exception as e:
                 return {"error": f"Error reading file: {str(e)}"}
 
@@ -595,117 +959,145 @@ class TextEditorServer:
             end = self.selected_end
             id = self.selected_id
 
-            current_content = "".join(lines[start - 1 : end])
+            if end >= len(offsets):
+                return {
+                    "error": "id verification failed. The content may have been modified since you last read it."
+                }
+            start_offset = offsets[start - 1]
+            end_offset = offsets[end]
 
-            computed_id = calculate_id(current_content, start, end)
+            # Hash the selection through a memoryview, without copying it out
+            computed_id = calculate_id(
+                memoryview(data)[start_offset:end_offset], start, end
+            )
 
             if computed_id != id:
                 return {
                     "error": "id verification failed. The content may have been modified since you last read it."
                 }
 
-            processed_new_lines = []
-            for line in new_lines:
-                if not line.endswith("\n"):
-                    processed_new_lines.append(line + "\n")
-                else:
-                    processed_new_lines.append(line)
+            # End the new lines like the rest of the file: only the tail is
+            # rewritten, so the untouched prefix keeps its line endings
+            newline = line_ending(data)
+            processed_new_lines = [terminate_line(line, newline) for line in new_lines]
+
+            # Only the lines shown as context around the edit are split out
+            context_start = max(1, start - 3)
+            context_end = min(len(offsets) - 1, end + 3)
+            context_lines = data[
+                offsets[context_start - 1] : offsets[context_end]
+            ].splitlines()
+            diff_result = generate_diff_preview(
+                context_lines, processed_new_lines, start, end, context_start
+            )
 
-            if (
-                processed_new_lines
-                and end < len(lines)
-                and not processed_new_lines[-1].endswith("\n")
-            ):
-                processed_new_lines[-1] += "\n"
+            # Splice the new lines into a copy of the file content in place of the
+            # selection: one memmove instead of rebuilding a list of all lines
+            replacement = "".join(processed_new_lines).encode("utf-8")
+            modified_content = bytearray(data)
+            modified_content[start_offset:end_offset] = replacement
 
-            before = lines[: start - 1]
-            after = lines[end:]
-            modified_lines = before + processed_new_lines + after
-            diff_result = generate_diff_preview(lines, modified_lines, start, end)
             error = None
             if self.current_file_path.endswith(".py"):
-                full_content = "".join(modified_lines)
+                # Only the parse is needed to validate syntax: PyCF_ONLY_AST stops
+                # CPython's compiler after building the AST, skipping codegen
                 try:
-                    black.format_file_contents(
-                        full_content,
-                        fast=True,
-                        mode=black.Mode(),
+                    compile(
+                        bytes(modified_content),
+                        self.current_file_path,
+                        "exec",
+                        flags=ast.PyCF_ONLY_AST,
+                        dont_inherit=True,
                     )
-                except black.InvalidInput as e:
+                except SyntaxError as e:
+                    # Errors about the source as a whole, such as null bytes,
+                    # have no line number
+                    location = f" at line {e.lineno}" if e.lineno else ""
                     error = {
-                        "error": f"Python syntax error: {str(e)}",
+                        "error": f"Python syntax error: {e.msg}{location}",
                         "diff_lines": diff_result,
                         "auto_cancel": self.fail_on_python_syntax_error,
                     }
-                except Exception as e:
-                    if not isinstance(e, NothingChanged):
-                        error = {
-                            "error": f"Black check raised {type(e)}: {str(e)}",
-                            "diff_lines": diff_result,
-                        }
 
             elif self.enable_js_syntax_check and self.current_file_path.endswith(
                 (".jsx", ".js")
             ):
-                with tempfile.NamedTemporaryFile(
-                    mode="w", suffix=".jsx", delete=False
-                ) as temp:
-                    temp_path = temp.name
-                    temp.writelines(modified_lines)
-
-                try:
-                    presets = (
-                        ["@babel/preset-react"]
-                        if self.current_file_path.endswith(".jsx")
-                        else ["@babel/preset-env"]
-                    )
-
-                    cmd = [
-                        "npx",
-                        "babel",
-                        "--presets",
-                        ",".join(presets),
-                        "--no-babelrc",
-                        temp_path,
-                        "--out-file",
-                        "/dev/null",  # Output to nowhere, we just want to check syntax
-                    ]
-
-                    # Execute Babel to transform (which validates syntax)
-                    process = subprocess.run(cmd, capture_output=True, text=True)
-
-                    if process.returncode != 0:
-                        error_output = process.stderr
+                if self._js_parser is not None:
+                    # tree-sitter parses in-process, no Node startup or temp file
+                    tree = self._js_parser.parse(bytes(modified_content))
+                    message = find_syntax_error(tree.root_node)
+                    if message is not None:
+                        error = {
+                            "error": f"JavaScript syntax error: {message}",
+                            "diff_lines": diff_result,
+                            "auto_cancel": self.fail_on_js_syntax_error,
+                        }
+                else:
+                    try:
+                        presets = (
+                            ["@babel/preset-react"]
+                            if self.current_file_path.endswith(".jsx")
+                            else ["@babel/preset-env"]
+                        )
 
-                        filtered_lines = []
-                        for line in error_output.split("\n"):
-                            if "node_modules/@babel" not in line:
-                                filtered_lines.append(line)
+                        # The source is piped over stdin and the transformed output
+                        # is discarded with the captured stdout, so no temp file
+                        cmd = [
+                            "npx",
+                            "babel",
+                            "--presets",
+                            ",".join(presets),
+                            "--no-babelrc",
+                            "--filename",
+                            self.current_file_path,
+                        ]
+
+                        # Execute Babel to transform (which validates syntax),
+                        # off the event loop so other tool calls are not blocked
+                        process = await asyncio.to_thread(
+                            subprocess.run,
+                            cmd,
+                            input=modified_content,
+                            capture_output=True,
+                        )
 
-                        filtered_error = "\n".join(filtered_lines).strip()
+                        if process.returncode != 0:
+                            stderr = process.stderr.decode("utf-8", errors="replace")
+                            filtered_error = (
+                                BABEL_STACK_LINE.sub("", stderr).strip()
+                                or "JavaScript syntax error detected"
+                            )
 
-                        if not filtered_error:
-                            filtered_error = "JavaScript syntax error detected"
+                            error = {
+                                "error": f"JavaScript syntax error: {filtered_error}",
+                                "diff_lines": diff_result,
+                                "auto_cancel": self.fail_on_js_syntax_error,
+                            }
 
+                    except Exception as e:
                         error = {
-                            "error": f"JavaScript syntax error: {filtered_error}",
+                            "error": f"Error checking JavaScript syntax: {str(e)}",
                             "diff_lines": diff_result,
-                            "auto_cancel": self.fail_on_js_syntax_error,
                         }
 
-                except Exception as e:
-                    os.unlink(temp_path)
-                    error = {
-                        "error": f"Error checking JavaScript syntax: {str(e)}",
-                        "diff_lines": diff_result,
-                    }
-
-                finally:
-                    if os.path.exists(temp_path):
-                        os.unlink(temp_path)
-
-            self.pending_modified_lines = modified_lines
+            self.pending_content = modified_content
             self.pending_diff = diff_result
+            # Everything before the selection is unchanged, so confirm() only has
+            # to rewrite the file from the start of the selection onwards
+            self.pending_write_offset = start_offset
+            # A same-length replacement leaves everything after the selection
+            # where it is, so only the replaced bytes need writing
+            self.pending_write_end = (
+                start_offset + len(replacement)
+                if len(replacement) == end_offset - start_offset
+                else None
+            )
+            # confirm() compares the file's mtime and size first and only hashes
+            # the region it rewrites, so the unchanged prefix is never hashed
+            self.pending_file_stat = file_stat
+            self.pending_file_digest = hashlib.sha256(
+                memoryview(data)[start_offset:]
+            ).digest()
 
             result = {
                 "status": "preview",
@@ -717,8 +1109,7 @@ class TextEditorServer:
             if error:
                 result.update(error)
                 if error.get("auto_cancel", False):
-                    self.pending_modified_lines = None
-                    self.pending_diff = None
+                    self._clear_pending()
                     result["status"] = "auto_cancelled"
                     result["message"] = (
                         "Changes automatically cancelled due to syntax error. The lines are still selected."
@@ -734,12 +1125,44 @@ class TextEditorServer:
         @self.mcp.tool()
         async def confirm() -> Dict[str, Any]:
             """Confirm action"""
-            if self.pending_modified_lines is None or self.pending_diff is None:
+            if self.pending_content is None or self.pending_diff is None:
                 return {"error": "No pending changes to apply. Use overwrite first."}
 
             try:
-                with open(self.current_file_path, "w", encoding="utf-8") as file:
-                    file.writelines(self.pending_modified_lines)
+                # Rewrite only the tail of the file: seek past the unchanged
+                # prefix, write the modified content and cut off whatever is
+                # left. A same-length edit writes just the replaced bytes.
+                tail = memoryview(self.pending_content)[
+                    self.pending_write_offset : self.pending_write_end
+                ]
+                async with self._file_lock(self.current_file_path):
+                    # The tail is written in place, so it must still be exactly
+                    # the one the pending changes were computed from. A changed
+                    # mtime or size fails fast; otherwise the tail is hashed to
+                    # catch edits that kept both
+                    st = await asyncio.to_thread(os.stat, self.current_file_path)
+                    unchanged = [st.st_mtime_ns, st.st_size] == self.pending_file_stat
+                    if unchanged:
+                        current_digest = await asyncio.to_thread(
+                            file_digest,
+                            self.current_file_path,
+                            self.pending_write_offset,
+                        )
+                        unchanged = current_digest == self.pending_file_digest
+                    if not unchanged:
+                        return {
+                            "error": "File has been modified since overwrite. Select the lines and overwrite them again."
+                        }
+                    await asyncio.to_thread(
+                        write_tail,
+                        self.current_file_path,
+                        self.pending_write_offset,
+                        tail,
+                        self.pending_write_end is None,
+                    )
+                    await asyncio.to_thread(
+                        self._store, self.current_file_path, bytes(self.pending_content)
+                    )
 
                 result = {
                     "status": "success",
@@ -749,8 +1172,7 @@ class TextEditorServer:
                 self.selected_start = None
                 self.selected_end = None
                 self.selected_id = None
-                self.pending_modified_lines = None
-                self.pending_diff = None
+                self._clear_pending()
 
                 return result
             except Exception as e:
@@ -761,11 +1183,10 @@ class TextEditorServer:
             """
             Cancel action
             """
-            if self.pending_modified_lines is None or self.pending_diff is None:
+            if self.pending_content is None or self.pending_diff is None:
                 return {"error": "No pending changes to discard. Use overwrite first."}
 
-            self.pending_modified_lines = None
-            self.pending_diff = None
+            self._clear_pending()
 
             return {
                 "status": "success",
@@ -782,10 +1203,10 @@ class TextEditorServer:
                 return {"error": "No file path is set. Use set_file first."}
 
             try:
-                if not os.path.exists(self.current_file_path):
-                    return {"error": f"File '{self.current_file_path}' does not exist."}
-
-                os.remove(self.current_file_path)
+                # os.remove reports a missing file itself, no separate exists() check
+                async with self._file_lock(self.current_file_path):
+                    await asyncio.to_thread(os.remove, self.current_file_path)
+                self._file_cache.pop(self.current_file_path, None)
 
                 deleted_path = self.current_file_path
 
@@ -795,6 +1216,8 @@ class TextEditorServer:
                     "status": "success",
                     "message": f"File '{deleted_path}' was successfully deleted.",
                 }
+            except FileNotFoundError:
+                return {"error": f"File '{self.current_file_path}' does not exist."}
             except Exception as e:
                 return {"error": f"Error deleting file: {str(e)}"}
 
@@ -814,14 +1237,6 @@ class TextEditorServer:
             """
             self.current_file_path = filepath
 
-            if (
-                os.path.exists(self.current_file_path)
-                and os.path.getsize(self.current_file_path) > 0
-            ):
-                return {
-                    "error": "Cannot create new file. Current file exists and is not empty."
-                }
-
             try:
                 # Create parent directories if they don't exist
                 directory = os.path.dirname(self.current_file_path)
@@ -829,8 +1244,18 @@ class TextEditorServer:
                     os.makedirs(directory, exist_ok=True)
 
                 text = "# NEW_FILE - REMOVE THIS HEADER"
-                with open(self.current_file_path, "w", encoding="utf-8") as file:
-                    file.write(text)
+                # Open without truncating and check the size on the open
+                # descriptor, so nothing can fill the file between check and write
+                fd = os.open(self.current_file_path, os.O_WRONLY | os.O_CREAT, 0o666)
+                try:
+                    if os.fstat(fd).st_size > 0:
+                        return {
+                            "error": "Cannot create new file. Current file exists and is not empty."
+                        }
+                    os.write(fd, text.encode("utf-8"))
+                finally:
+                    os.close(fd)
+                self._file_cache.pop(self.current_file_path, None)
 
                 # Automatically select the first line for editing
                 self.selected_start = 1
@@ -854,33 +1279,64 @@ class TextEditorServer:
         @self.mcp.tool()
         async def find_line(
             search_text: str,
+            limit: int = 1000,
         ) -> Dict[str, Any]:
             """
             Find lines that match provided text in the current file.
 
             Args:
                 search_text (str): Text to search for in the file
+                limit (int, optional): Maximum number of matching lines to return
 
             Returns:
-                dict: Matching lines with their line numbers, and full text
+                dict: Matching lines with their line numbers, and full text. total_matches
+                      is the number of lines returned; truncated is set when more
+                      lines match beyond `limit`
             """
             if self.current_file_path is None:
                 return {"error": "No file path is set. Use set_file first."}
+            if limit < 1:
+                return {"error": "limit must be at least 1"}
 
             try:
-                with open(self.current_file_path, "r", encoding="utf-8") as file:
-                    lines = file.readlines()
+                data, offsets = await asyncio.to_thread(
+                    self._load_offsets, self.current_file_path
+                )
 
+                # Scan the whole buffer with bytes.find instead of testing every
+                # line in Python; each hit is mapped to its line by bisecting
+                # the line start offsets
+                needle = search_text.encode("utf-8")
                 matches = []
-                for i, line in enumerate(lines, start=1):
-                    if search_text in line:
-                        matches.append([i, line])
+                pos = data.find(needle)
+                truncated = False
+                while pos != -1 and pos < len(data):
+                    line_number = bisect.bisect_right(offsets, pos)
+                    line_start = offsets[line_number - 1]
+                    line_end = offsets[line_number]
+                    if pos + len(needle) > line_end:
+                        # The hit spans a line break, which a per-line search can't match
+                        pos = data.find(needle, pos + 1)
+                        continue
+                    if len(matches) >= limit:
+                        # Another line matches beyond the ones returned
+                        truncated = True
+                        break
+                    # A single line's slice ends in at most one line break
+                    line = data[line_start:line_end].rstrip(b"\r\n")
+                    matches.append((line_number, line.decode("utf-8")))
+                    pos = data.find(needle, line_end)
 
                 result = {
                     "status": "success",
                     "matches": matches,
                     "total_matches": len(matches),
                 }
+                if truncated:
+                    result["truncated"] = True
+                    result["hint"] = (
+                        f"Only the first {limit} matching lines are shown. Use a more specific `search_text` to narrow down the results."
+                    )
 
                 return result
 
@@ -930,16 +1386,21 @@ class TextEditorServer:
                 }
 
             try:
-                with open(self.current_file_path, "r", encoding="utf-8") as file:
-                    source_code = file.read()
-                    lines = source_code.splitlines(True)  # Keep line endings
+                data, offsets = await asyncio.to_thread(
+                    self._load_offsets, self.current_file_path
+                )
 
                 # Process JavaScript/JSX files
                 if is_javascript:
-                    return self._find_js_function(function_name, source_code, lines)
+                    lines = [line.decode("utf-8") for line in data.splitlines(True)]
+                    # May spawn Babel, so run it off the event loop
+                    return await asyncio.to_thread(
+                        self._find_js_function, function_name, "".join(lines), lines
+                    )
 
-                # For Python files, parse the source code to AST
-                tree = ast.parse(source_code)
+                # For Python files, parse the source code to AST; both ast and
+                # tokenize read the raw bytes, so the file is never decoded whole
+                tree = ast.parse(data)
 
                 # Find the function in the AST
                 function_node = None
@@ -993,8 +1454,7 @@ class TextEditorServer:
                 end_line = 0
 
                 # Find the end line by looking at tokens
-                with open(self.current_file_path, "rb") as file:
-                    tokens = list(tokenize.tokenize(file.readline))
+                tokens = list(tokenize.tokenize(io.BytesIO(data).readline))
 
                 # Find the function definition token
                 function_def_index = -1
@@ -1072,7 +1532,7 @@ class TextEditorServer:
 
                     # If we couldn't find the end, use the last line of the file
                     if end_line == 0:
-                        end_line = len(lines)
+                        end_line = len(offsets) - 1
 
                 # Include decorators if present
                 for decorator in function_node.decorator_list:
@@ -1090,16 +1550,15 @@ class TextEditorServer:
                         start_line = class_node.lineno
 
                 # Normalize line numbers (1-based for API consistency)
-                function_lines = lines[start_line - 1 : end_line]
-
-                # Format the results similar to the read tool
-                formatted_lines = []
-                for i, line in enumerate(function_lines, start_line):
-                    formatted_lines.append((i, line.rstrip()))
+                function_lines = data[
+                    offsets[start_line - 1] : offsets[end_line]
+                ].splitlines()
 
                 result = {
                     "status": "success",
-                    "lines": formatted_lines,
+                    "lines": number_lines(
+                        map(bytes.decode, function_lines), start_line
+                    ),
                     "start_line": start_line,
                     "end_line": end_line,
                 }
@@ -1164,7 +1623,7 @@ class TextEditorServer:
                 pytest_args.append("--collect-only")
 
             # Run the tests
-            return self._run_tests(pytest_args)
+            return await asyncio.to_thread(self._run_tests, pytest_args)
 
     def _find_js_function(
         self, function_name: str, source_code: str, lines: list
@@ -1302,14 +1761,9 @@ class TextEditorServer:
             # Extract the function lines
             function_lines = lines[start_line - 1 : end_line]
 
-            # Format results like the read tool
-            formatted_lines = []
-            for i, line in enumerate(function_lines, start_line):
-                formatted_lines.append((i, line.rstrip()))
-
             result = {
                 "status": "success",
-                "lines": formatted_lines,
+                "lines": number_lines(function_lines, start_line),
                 "start_line": start_line,
                 "end_line": end_line,
             }
@@ -1407,14 +1861,9 @@ class TextEditorServer:
             # Extract the function lines
             function_lines = lines[start_line - 1 : end_line]
 
-            # Format results like the read tool
-            formatted_lines = []
-            for i, line in enumerate(function_lines, start_line):
-                formatted_lines.append((i, line.rstrip()))
-
             result = {
                 "status": "success",
-                "lines": formatted_lines,
+                "lines": number_lines(function_lines, start_line),
                 "start_line": start_line,
                 "end_line": end_line,
                 "parser": "babel",  # Flag that this was parsed with Babel
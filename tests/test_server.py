@@ -1,10 +1,20 @@
+import asyncio
 import os
 import pytest
 import tempfile
-import hashlib
-
-
-from src.text_editor.server import TextEditorServer, calculate_id, generate_diff_preview
+import zlib
+
+
+from src.text_editor.server import (
+    TextEditorServer,
+    calculate_id,
+    count_lines,
+    head_lines,
+    generate_diff_preview,
+    line_ending,
+    line_offsets,
+    terminate_line,
+)
 from mcp.server.fastmcp import FastMCP
 
 
@@ -245,15 +255,67 @@ class TestTextEditorServer:
         assert "error" in result
         assert "start must be at least 1" in result["error"]
 
+    @pytest.mark.asyncio
+    async def test_read_many(self, server, temp_file):
+        """Test reading several line ranges in one call."""
+        read_many_fn = self.get_tool_fn(server, "read_many")
+        result = await read_many_fn([[1, 2]])
+        assert "No file path is set" in result["error"]
+
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(temp_file)
+        read_fn = self.get_tool_fn(server, "read")
+        result = await read_many_fn([[1, 2], [4, 10]])
+        assert result["ranges"] == [await read_fn(1, 2), await read_fn(4, 10)]
+        assert result["ranges"][1]["end_line"] == 5
+
+        result = await read_many_fn([[1, 2], [4, 2]])
+        assert "start=4 cannot be greater than end=2" in result["error"]
+
+        assert await read_many_fn([]) == {"ranges": []}
+        for ranges in [[[1]], [[1, 2, 3]], [1, 2]]:
+            result = await read_many_fn(ranges)
+            assert result["error"] == "ranges must be [start, end] pairs"
+
     def test_calculate_id_function(self):
         """Test the calculate_id function directly."""
         text = "Some test content"
         id_no_range = calculate_id(text)
-        expected = hashlib.sha256(text.encode()).hexdigest()[:2]
+        expected = f"{zlib.crc32(text.encode()) & 0xFF:02x}"
         assert id_no_range == expected
         id_with_range = calculate_id(text, 1, 3)
         assert id_with_range.startswith("L1-3-")
         assert id_with_range.endswith(expected)
+        # Bytes are hashed as the UTF-8 encoding of the same text
+        assert calculate_id(text.encode(), 1, 3) == id_with_range
+
+    def test_line_offsets_function(self):
+        """Test the line_offsets function directly."""
+        assert line_offsets(b"") == [0]
+        assert line_offsets(b"a\nbb\nccc\n") == [0, 2, 5, 9]
+        # A missing trailing newline still counts as a line
+        assert line_offsets(b"a\nbb") == [0, 2, 4]
+        assert line_offsets(b"a\r\nb\rc") == [0, 3, 5, 6]
+
+    def test_line_ending_function(self):
+        """Test that line_ending reports the first line break in the data."""
+        assert line_ending(b"a\r\nb\n") == "\r\n"
+        assert line_ending(b"a\nb\r\n") == "\n"
+        assert line_ending(b"a\rb") == "\r"
+        assert line_ending(b"no break") == "\n"
+
+    def test_terminate_line_function(self):
+        """Test that terminate_line ends lines with the given line ending."""
+        assert terminate_line("a", "\r\n") == "a\r\n"
+        assert terminate_line("a\n", "\r\n") == "a\r\n"
+        assert terminate_line("a\nb\r", "\r\n") == "a\r\nb\r\n"
+        assert terminate_line("", "\n") == "\n"
+        assert terminate_line("\r\n", "\n") == "\n"
+
+    def test_count_lines_function(self):
+        """Test that count_lines agrees with line_offsets."""
+        for data in [b"", b"a", b"a\n", b"a\nbb", b"\n\n", b"a\r\nb\rc", b"a\r\r\n"]:
+            assert count_lines(data) == len(line_offsets(data)) - 1
 
     @pytest.mark.asyncio
     async def test_read_large_file(self, server):
@@ -296,6 +358,8 @@ class TestTextEditorServer:
         assert "id" in result
         result = await new_file_fn(empty_temp_file)
         assert "error" in result
+        with open(empty_temp_file) as f:
+            assert f.read() == "# NEW_FILE - REMOVE THIS HEADER"
 
     @pytest.mark.asyncio
     async def test_delete_file(self, server):
@@ -323,6 +387,20 @@ class TestTextEditorServer:
             if os.path.exists(temp_path):
                 os.unlink(temp_path)
 
+    @pytest.mark.asyncio
+    async def test_delete_file_missing(self, server):
+        """Test delete_file when the file was removed after set_file."""
+        with tempfile.NamedTemporaryFile(mode="w+", delete=False) as f:
+            temp_path = f.name
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(temp_path)
+        os.unlink(temp_path)
+        delete_file_fn = self.get_tool_fn(server, "delete_file")
+        result = await delete_file_fn()
+        assert "error" in result
+        assert "does not exist" in result["error"]
+        assert server.current_file_path == temp_path
+
     @pytest.mark.asyncio
     async def test_delete_file_permission_error(self, server, monkeypatch):
         """Test delete_file with permission error."""
@@ -389,6 +467,44 @@ class TestTextEditorServer:
         assert result["matches"][0][0] == 3  # First element is the line number
         assert "Line 3" in result["matches"][0][1]  # Second element is the line text
 
+    @pytest.mark.asyncio
+    async def test_find_line_mixed_line_endings(self, server):
+        """Test find_line numbers lines the same way read does for CR and CRLF."""
+        with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
+            f.write(b"one\r\ntwo\rthree\nfour")
+            path = f.name
+        try:
+            set_file_fn = self.get_tool_fn(server, "set_file")
+            await set_file_fn(path)
+            find_line_fn = self.get_tool_fn(server, "find_line")
+            result = await find_line_fn(search_text="o")
+            assert [match[0] for match in result["matches"]] == [1, 2, 4]
+            # Matched text matches what read returns, whatever the line ending
+            read_fn = self.get_tool_fn(server, "read")
+            read_lines = (await read_fn(1, 4))["lines"]
+            assert result["matches"] == [read_lines[0], read_lines[1], read_lines[3]]
+            assert result["matches"][1] == (2, "two")
+            result = await find_line_fn(search_text="three")
+            assert result["matches"] == [(3, "three")]
+        finally:
+            os.unlink(path)
+
+    @pytest.mark.asyncio
+    async def test_find_line_limit(self, server, temp_file):
+        """Test find_line stops after `limit` matching lines."""
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(temp_file)
+        find_line_fn = self.get_tool_fn(server, "find_line")
+        result = await find_line_fn(search_text="Line", limit=2)
+        assert [match[0] for match in result["matches"]] == [1, 2]
+        assert result["total_matches"] == 2
+        assert result["truncated"] is True
+        result = await find_line_fn(search_text="Line 5", limit=1)
+        assert result["total_matches"] == 1
+        assert "truncated" not in result
+        result = await find_line_fn(search_text="Line", limit=0)
+        assert result["error"] == "limit must be at least 1"
+
     @pytest.mark.asyncio
     async def test_find_line_no_matches(self, server, temp_file):
         """Test find_line with a search term that doesn't exist."""
@@ -425,6 +541,25 @@ class TestTextEditorServer:
             assert line_data[0] == i  # Check line number
             assert line_data[1] == f"Line {i}"  # Check line content
 
+    def test_head_lines_function(self):
+        """Test head_lines agrees with bytes.splitlines for every line ending."""
+        data = b"a\r\nb\rc\n\nd"
+        for n in range(7):
+            assert head_lines(data, n) == data.splitlines()[:n]
+
+    @pytest.mark.asyncio
+    async def test_skim_truncated(self, server, temp_file):
+        """Test that skim stops at skim_max_lines and adds a hint."""
+        server.skim_max_lines = 2
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(temp_file)
+        skim_fn = self.get_tool_fn(server, "skim")
+        result = await skim_fn()
+        assert result["total_lines"] == 5
+        assert result["lines"] == [(1, "Line 1"), (2, "Line 2")]
+        assert result["truncated"] is True
+        assert "Only showing first 2 lines" in result["hint"]
+
     @pytest.mark.asyncio
     async def test_overwrite_no_selection(self, server, temp_file):
         """Test overwrite when no selection has been made."""
@@ -521,8 +656,12 @@ class TestTextEditorServer:
         assert server.selected_start == 2
         assert server.selected_end == 4
         assert server.selected_id is not None
-        assert server.pending_modified_lines is None
+        assert server.pending_content is None
         assert server.pending_diff is None
+        assert server.pending_write_offset is None
+        assert server.pending_write_end is None
+        assert server.pending_file_stat is None
+        assert server.pending_file_digest is None
 
     @pytest.mark.asyncio
     async def test_select_invalid_range(self, server, temp_file):
@@ -639,9 +778,11 @@ class TestTextEditorServer:
         select_result = await select_fn(2, 3)
         assert select_result["status"] == "success"
         original_open = open
+        # Force overwrite to go back to disk instead of the read cache
+        server._file_cache.clear()
 
         def mock_open_read(*args, **kwargs):
-            if args[1] == "r":
+            if args[1] == "rb":
                 raise IOError("Mock file read error")
             return original_open(*args, **kwargs)
 
@@ -652,6 +793,49 @@ class TestTextEditorServer:
         assert "Error reading file" in result["error"]
         assert "Mock file read error" in result["error"]
 
+    @pytest.mark.asyncio
+    async def test_read_uses_file_cache(self, server, temp_file, monkeypatch):
+        """Test that unchanged files are served from the cache and changed ones reloaded."""
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(temp_file)
+        read_fn = self.get_tool_fn(server, "read")
+        first = await read_fn(1, 2)
+        assert temp_file in server._file_cache
+        # The line offsets are kept with the cached bytes
+        data, offsets = server._file_cache[temp_file][2:]
+        assert offsets == line_offsets(data)
+        original_open = open
+
+        def mock_open_read(*args, **kwargs):
+            if args[1] == "rb":
+                raise IOError("Mock file read error")
+            return original_open(*args, **kwargs)
+
+        monkeypatch.setattr("builtins.open", mock_open_read)
+        assert await read_fn(1, 2) == first
+        monkeypatch.undo()
+
+        with open(temp_file, "w") as f:
+            f.write("Changed line 1\nChanged line 2\nChanged line 3\n")
+        result = await read_fn(1, 2)
+        assert result["lines"] == [(1, "Changed line 1"), (2, "Changed line 2")]
+
+    @pytest.mark.asyncio
+    async def test_file_cache_concurrent_eviction(self, server, tmp_path):
+        """Test that concurrent loads evicting each other always return content."""
+        paths = []
+        for i in range(8):
+            path = tmp_path / f"file_{i}.txt"
+            path.write_bytes(f"content {i}\n".encode())
+            paths.append(str(path))
+        for size in (1, 0):
+            server.file_cache_size = size
+            loaded = await asyncio.gather(
+                *(asyncio.to_thread(server._load, path) for path in paths * 20)
+            )
+            assert loaded == [f"content {i}\n".encode() for i in range(8)] * 20
+            assert len(server._file_cache) <= size
+
     @pytest.mark.asyncio
     async def test_overwrite_file_write_error(self, server, temp_file, monkeypatch):
         """Test overwrite with file write error."""
@@ -664,7 +848,7 @@ class TestTextEditorServer:
         open_calls = [0]
 
         def mock_open_write(*args, **kwargs):
-            if args[1] == "w":
+            if args[1] == "r+b":
                 raise IOError("Mock file write error")
             return original_open(*args, **kwargs)
 
@@ -705,6 +889,116 @@ class TestTextEditorServer:
             if os.path.exists(temp_path):
                 os.unlink(temp_path)
 
+    @pytest.mark.asyncio
+    async def test_confirm_file_modified_after_overwrite(self, server, temp_file):
+        """Test that confirm refuses to write if the file changed after overwrite."""
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(temp_file)
+        select_fn = self.get_tool_fn(server, "select")
+        await select_fn(2, 2)
+        overwrite_fn = self.get_tool_fn(server, "overwrite")
+        result = await overwrite_fn(new_lines={"lines": ["New Line 2"]})
+        assert result["status"] == "preview"
+        with open(temp_file, "w") as f:
+            f.write("Changed elsewhere\n")
+        confirm_fn = self.get_tool_fn(server, "confirm")
+        confirm_result = await confirm_fn()
+        assert "error" in confirm_result
+        assert "modified since overwrite" in confirm_result["error"]
+        with open(temp_file, "r") as f:
+            assert f.read() == "Changed elsewhere\n"
+
+        # An edit that keeps the size and mtime is caught by the tail digest
+        with open(temp_file, "w") as f:
+            f.write("Line 1\nLine 2\nLine 3\nLine 4\nLine 5\n")
+        await select_fn(2, 2)
+        result = await overwrite_fn(new_lines={"lines": ["New Line 2"]})
+        assert result["status"] == "preview"
+        st = os.stat(temp_file)
+        with open(temp_file, "w") as f:
+            f.write("Line 1\nLine 2\nLine 3\nLine X\nLine 5\n")
+        os.utime(temp_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        confirm_result = await confirm_fn()
+        assert "modified since overwrite" in confirm_result["error"]
+
+    @pytest.mark.asyncio
+    async def test_overwrite_same_length_writes_only_selection(self, server):
+        """Test that a same-length edit leaves the rest of the file untouched."""
+        with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
+            f.write(b"Line 1\r\nLine 2\r\nLine 3\r\n")
+            temp_path = f.name
+        try:
+            set_file_fn = self.get_tool_fn(server, "set_file")
+            await set_file_fn(temp_path)
+            select_fn = self.get_tool_fn(server, "select")
+            await select_fn(2, 2)
+            overwrite_fn = self.get_tool_fn(server, "overwrite")
+            result = await overwrite_fn(new_lines={"lines": ["Line X"]})
+            assert result["status"] == "preview"
+            assert server.pending_write_offset == 8
+            assert server.pending_write_end == 16
+            confirm_fn = self.get_tool_fn(server, "confirm")
+            confirm_result = await confirm_fn()
+            assert confirm_result["status"] == "success"
+            with open(temp_path, "rb") as f:
+                assert f.read() == b"Line 1\r\nLine X\r\nLine 3\r\n"
+        finally:
+            os.unlink(temp_path)
+
+    @pytest.mark.asyncio
+    async def test_overwrite_invalid_utf8_context(self, server, tmp_path):
+        """Test that invalid UTF-8 near the selection does not break the preview."""
+        path = tmp_path / "binary.txt"
+        path.write_bytes(b"ok\n\xff\xfe\n")
+        set_file_fn = self.get_tool_fn(server, "set_file")
+        await set_file_fn(str(path))
+        select_fn = self.get_tool_fn(server, "select")
+        await select_fn(1, 1)
+        overwrite_fn = self.get_tool_fn(server, "overwrite")
+        result = await overwrite_fn(new_lines={"lines": ["OK"]})
+        assert result["status"] == "preview"
+        assert (2, "\ufffd\ufffd") in result["diff_lines"]
+        confirm_fn = self.get_tool_fn(server, "confirm")
+        assert (await confirm_fn())["status"] == "success"
+        assert path.read_bytes() == b"OK\n\xff\xfe\n"
+
+    @pytest.mark.asyncio
+    async def test_overwrite_keeps_crlf_prefix(self, server):
+        """Test that confirm only rewrites the file from the selection onwards."""
+        with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
+            f.write(b"Line 1\r\nLine 2\r\nLine 3\r\nLine 4\r\n")
+            temp_path = f.name
+        try:
+            set_file_fn = self.get_tool_fn(server, "set_file")
+            await set_file_fn(temp_path)
+            select_fn = self.get_tool_fn(server, "select")
+            select_result = await select_fn(3, 3)
+            assert select_result["status"] == "success"
+            overwrite_fn = self.get_tool_fn(server, "overwrite")
+            result = await overwrite_fn(new_lines={"lines": ["New Line 3"]})
+            assert result["status"] == "preview"
+            assert server.pending_write_offset == len(b"Line 1\r\nLine 2\r\n")
+            assert server.pending_write_end is None
+            confirm_fn = self.get_tool_fn(server, "confirm")
+            confirm_result = await confirm_fn()
+            assert confirm_result["status"] == "success"
+            with open(temp_path, "rb") as f:
+                file_content = f.read()
+            # New lines take the file's CRLF endings
+            assert file_content == b"Line 1\r\nLine 2\r\nNew Line 3\r\nLine 4\r\n"
+
+            # LF line breaks in or at the end of the new lines are converted too
+            await select_fn(2, 2)
+            await overwrite_fn(new_lines={"lines": ["B\n", "B2\nB3"]})
+            await confirm_fn()
+            with open(temp_path, "rb") as f:
+                file_content = f.read()
+            expected = b"Line 1\r\nB\r\nB2\r\nB3\r\nNew Line 3\r\nLine 4\r\n"
+            assert file_content == expected
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
     @pytest.mark.asyncio
     async def test_overwrite_python_syntax_check_success(self, server):
         """Test Python syntax checking in overwrite succeeds with valid Python code."""
@@ -770,6 +1064,13 @@ class TestTextEditorServer:
             result = await overwrite_fn(new_lines=invalid_python)
             assert "error" in result
             assert "Python syntax error:" in result["error"]
+            assert "at line 1" in result["error"]
+            # Null bytes are reported without a line number
+            await select_fn(1, 4)
+            result = await overwrite_fn(new_lines={"lines": ["x = 1\x00"]})
+            assert result["error"] == (
+                "Python syntax error: source code string cannot contain null bytes"
+            )
             with open(py_file_path, "r") as f:
                 file_content = f.read()
             assert file_content == valid_python_content
@@ -789,12 +1090,14 @@ class TestTextEditorServer:
             class MockCompletedProcess:
                 def __init__(self):
                     self.returncode = 0
-                    self.stderr = ""
-                    self.stdout = ""
+                    self.stderr = b""
+                    self.stdout = b""
 
             return MockCompletedProcess()
 
         monkeypatch.setattr("subprocess.run", mock_subprocess_run)
+        # Exercise the Babel fallback used when tree-sitter is not installed
+        monkeypatch.setattr(server, "_js_parser", None)
         try:
             set_file_fn = self.get_tool_fn(server, "set_file")
             await set_file_fn(js_file_path)
@@ -837,12 +1140,17 @@ class TestTextEditorServer:
             class MockCompletedProcess:
                 def __init__(self):
                     self.returncode = 1
-                    self.stderr = "SyntaxError: Unexpected token (1:19)"
-                    self.stdout = ""
+                    self.stderr = (
+                        b"SyntaxError: Unexpected token (1:19)\n"
+                        b"    at node_modules/@babel/parser/lib/index.js:1:1"
+                    )
+                    self.stdout = b""
 
             return MockCompletedProcess()
 
         monkeypatch.setattr("subprocess.run", mock_subprocess_run)
+        # Exercise the Babel fallback used when tree-sitter is not installed
+        monkeypatch.setattr(server, "_js_parser", None)
         try:
             set_file_fn = self.get_tool_fn(server, "set_file")
             await set_file_fn(js_file_path)
@@ -861,6 +1169,8 @@ class TestTextEditorServer:
             result = await overwrite_fn(new_lines=invalid_js)
             assert "error" in result
             assert "JavaScript syntax error:" in result["error"]
+            assert "Unexpected token (1:19)" in result["error"]
+            assert "node_modules/@babel" not in result["error"]
             with open(js_file_path, "r") as f:
                 file_content = f.read()
             assert file_content == valid_js_content
@@ -876,16 +1186,22 @@ class TestTextEditorServer:
             f.write(valid_jsx_content)
             jsx_file_path = f.name
 
+        babel_inputs = []
+
         def mock_subprocess_run(*args, **kwargs):
+            babel_inputs.append(kwargs.get("input"))
+
             class MockCompletedProcess:
                 def __init__(self):
                     self.returncode = 0
-                    self.stderr = ""
-                    self.stdout = ""
+                    self.stderr = b""
+                    self.stdout = b""
 
             return MockCompletedProcess()
 
         monkeypatch.setattr("subprocess.run", mock_subprocess_run)
+        # Exercise the Babel fallback used when tree-sitter is not installed
+        monkeypatch.setattr(server, "_js_parser", None)
         try:
             set_file_fn = self.get_tool_fn(server, "set_file")
             await set_file_fn(jsx_file_path)
@@ -906,6 +1222,9 @@ class TestTextEditorServer:
             }
             result = await overwrite_fn(new_lines=new_jsx_content)
             assert result["status"] == "preview"
+            # The modified source is piped to Babel instead of a temp file
+            expected_input = "\n".join(new_jsx_content["lines"]) + "\n"
+            assert babel_inputs == [expected_input.encode()]
             confirm_fn = self.get_tool_fn(server, "confirm")
             confirm_result = await confirm_fn()
             assert confirm_result["status"] == "success"
@@ -930,12 +1249,14 @@ class TestTextEditorServer:
             class MockCompletedProcess:
                 def __init__(self):
                     self.returncode = 1
-                    self.stderr = "SyntaxError: Unexpected token (4:10)"
-                    self.stdout = ""
+                    self.stderr = b"SyntaxError: Unexpected token (4:10)"
+                    self.stdout = b""
 
             return MockCompletedProcess()
 
         monkeypatch.setattr("subprocess.run", mock_subprocess_run)
+        # Exercise the Babel fallback used when tree-sitter is not installed
+        monkeypatch.setattr(server, "_js_parser", None)
         try:
             set_file_fn = self.get_tool_fn(server, "set_file")
             await set_file_fn(jsx_file_path)
@@ -963,21 +1284,60 @@ class TestTextEditorServer:
             if os.path.exists(jsx_file_path):
                 os.unlink(jsx_file_path)
 
+    def test_js_parser_falls_back_to_babel(self, monkeypatch):
+        """Test that a tree-sitter that cannot load the grammar leaves Babel in use."""
+        tree_sitter = pytest.importorskip("tree_sitter")
+        pytest.importorskip("tree_sitter_javascript")
+
+        def incompatible_language(*args, **kwargs):
+            raise ValueError("Incompatible Language version")
+
+        monkeypatch.setattr(tree_sitter, "Language", incompatible_language)
+        assert TextEditorServer()._js_parser is None
+        monkeypatch.undo()
+
+        monkeypatch.setenv("ENABLE_JS_SYNTAX_CHECK", "0")
+        assert TextEditorServer()._js_parser is None
+
+    @pytest.mark.asyncio
+    async def test_overwrite_jsx_syntax_check_tree_sitter(self, server):
+        """Test in-process JSX syntax checking with tree-sitter."""
+        pytest.importorskip("tree_sitter_javascript")
+        valid_jsx_content = (
+            "function HelloWorld() {\n  return <div>Hello, world!</div>;\n}\n"
+        )
+        with tempfile.NamedTemporaryFile(mode="w+", suffix=".jsx", delete=False) as f:
+            f.write(valid_jsx_content)
+            jsx_file_path = f.name
+        try:
+            set_file_fn = self.get_tool_fn(server, "set_file")
+            await set_file_fn(jsx_file_path)
+            select_fn = self.get_tool_fn(server, "select")
+            await select_fn(2, 2)
+            overwrite_fn = self.get_tool_fn(server, "overwrite")
+            result = await overwrite_fn(
+                new_lines={"lines": ["  return <div>Hello, {name}!</div>;"]}
+            )
+            assert result["status"] == "preview"
+            cancel_fn = self.get_tool_fn(server, "cancel")
+            await cancel_fn()
+
+            result = await overwrite_fn(new_lines={"lines": ["  return <div>Hello;"]})
+            assert "error" in result
+            assert "JavaScript syntax error:" in result["error"]
+            assert "line 2" in result["error"]
+        finally:
+            if os.path.exists(jsx_file_path):
+                os.unlink(jsx_file_path)
+
     @pytest.mark.asyncio
     async def test_generate_diff_preview(self):
         """Test the generate_diff_preview function directly."""
-        original_lines = ["Line 1", "Line 2", "Line 3", "Line 4", "Line 5"]
-        modified_lines = [
-            "Line 1",
-            "Modified Line 2",
-            "New Line",
-            "Line 3",
-            "Line 4",
-            "Line 5",
-        ]
+        original_lines = ["Line 1\n", "Line 2\n", "Line 3\n", "Line 4\n", "Line 5\n"]
+        new_lines = ["Modified Line 2\n", "New Line\n"]
 
         # Testing replacement in the middle of the file
-        result = generate_diff_preview(original_lines, modified_lines, 2, 3)
+        result = generate_diff_preview(original_lines, new_lines, 2, 3)
 
         # Verify the result contains the expected diff_lines key
         assert "diff_lines" in result
@@ -1004,12 +1364,25 @@ class TestTextEditorServer:
             for item in diff_lines_list
             if isinstance(item[0], str) and item[0].startswith("+")
         ]
-        assert len(added_lines) > 0
+        assert added_lines == [("+2", "Modified Line 2"), ("+3", "New Line")]
 
         # Verify context after the change (line 4 and 5)
         assert any(item for item in diff_lines_list if item[0] == 4)
         assert any(item for item in diff_lines_list if item[0] == 5)
 
+        # Undecoded file lines produce the same preview
+        encoded_lines = [line.encode() for line in original_lines]
+        assert generate_diff_preview(encoded_lines, new_lines, 2, 3) == result
+
+        # Passing just the lines around the edit gives the same preview
+        long_lines = [f"Line {i}\n" for i in range(1, 11)]
+        full = generate_diff_preview(long_lines, new_lines, 6, 6)
+        assert generate_diff_preview(long_lines[2:9], new_lines, 6, 6, 3) == full
+
+        # A new line holding several lines is numbered line by line
+        joined_lines = ["Modified Line 2\nNew Line\n"]
+        assert generate_diff_preview(original_lines, joined_lines, 2, 3) == result
+
     @pytest.fixture
     def python_test_file(self):
         """Create a Python test file with various functions and methods for testing find_function."""